@@ -0,0 +1,29 @@
+"""
+Runtime configuration for the Image Search application.
+Values are read from environment variables so deployments can tune them without code changes.
+"""
+import os
+
+# Number of images encoded per forward pass during background indexing.
+INDEX_BATCH_SIZE = int(os.environ.get("INDEX_BATCH_SIZE", "64"))
+
+# Worker processes decoding images for the indexing DataLoader.
+INDEX_NUM_WORKERS = int(os.environ.get("INDEX_NUM_WORKERS", str((os.cpu_count() or 2) // 2)))
+
+# Serve image embeddings from an ONNX Runtime export of the CLIP vision tower.
+USE_ONNX = os.environ.get("USE_ONNX", "0").lower() in ("1", "true", "yes")
+
+# Copy large FAISS indexes to the GPU for searching when FAISS has GPU support.
+USE_GPU = os.environ.get("USE_GPU", "1").lower() in ("1", "true", "yes")
+
+# Newly indexed images are buffered in memory and merged into the index file once this many are pending...
+DELTA_MERGE_SIZE = int(os.environ.get("DELTA_MERGE_SIZE", "1000"))
+
+# ...or once this many seconds have passed since the first of them was buffered.
+DELTA_MERGE_INTERVAL = float(os.environ.get("DELTA_MERGE_INTERVAL", "60"))
+
+# Searches arriving within this many milliseconds of each other are encoded and searched together...
+SEARCH_BATCH_WINDOW_MS = float(os.environ.get("SEARCH_BATCH_WINDOW_MS", "5"))
+
+# ...up to this many queries per batch.
+SEARCH_BATCH_SIZE = int(os.environ.get("SEARCH_BATCH_SIZE", "32"))
@@ -4,23 +4,48 @@ Handles image processing, indexing, and similarity search functionality.
 """
 from pathlib import Path
 import logging
+import os
 from sentence_transformers import SentenceTransformer
+from app.config import DELTA_MERGE_INTERVAL, DELTA_MERGE_SIZE, INDEX_BATCH_SIZE, INDEX_NUM_WORKERS, USE_GPU, USE_ONNX
 from app.models.indexing import IndexingManager
 from app.utils.image_processor import ImageProcessor
+from app.utils.onnx_encoder import export_vision_encoder, create_inference_session
+from app.utils.path_store import PathStore
 from app.utils.search import (
     create_faiss_index, 
     load_faiss_index, 
     retrieve_similar_images,
+    retrieve_similar_images_batch,
     add_to_faiss_index,
-    cleanup_faiss_index
+    cleanup_faiss_index,
+    DeltaIndex,
+    gpu_available,
+    index_to_gpu,
+    GPU_INDEX_THRESHOLD
 )
+import faiss
+import numpy as np
 import threading
-import time
 import torch
 from typing import Tuple, List
 
 logger = logging.getLogger(__name__)
 
+def _file_size(path: Path) -> int:
+    """
+    Size of a file for ordering the indexing queue.
+    
+    Args:
+        path (Path): File to measure
+        
+    Returns:
+        int: Size in bytes, or 0 if the file has vanished or cannot be read
+    """
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
 class AIPhotoGallery:
     """
     Main class for managing the AI-powered photo gallery.
@@ -33,6 +58,7 @@ class AIPhotoGallery:
         """
         self.images_path = Path("images")
         self.index_path = Path("Index/vector.index")
+        self.onnx_path = Path("Index/clip_vit_l14.onnx")
         
         self.index_path.parent.mkdir(parents=True, exist_ok=True)
         self.images_path.mkdir(parents=True, exist_ok=True)
@@ -41,24 +67,47 @@ class AIPhotoGallery:
         print(f"Using device: {device}")
         self.model = SentenceTransformer("clip-ViT-L-14", device=device)
         self.model = self.model.to(device)
-        for param in self.model.parameters():
-            param.data = param.data.contiguous()
+        if device == "cuda":
+            torch.backends.cudnn.benchmark = True
+            torch.set_float32_matmul_precision("high")
+        if USE_ONNX and not self.onnx_path.exists():
+            print(f"Exporting vision encoder to {self.onnx_path}...")
+            export_vision_encoder(self.model, self.onnx_path)
+        if device == "cuda":
+            self.model = self.model.half()
+        self.model.eval()
         
         self.indexing_manager = IndexingManager()
         self.image_processor = ImageProcessor(self.images_path, self.model)
+        if USE_ONNX:
+            self.image_processor.set_onnx_session(create_inference_session(self.onnx_path, device))
         self._index_lock = threading.Lock()
         self._index_cache = None
-        self._last_index_update = 0
+        self._gpu_resources = None
         self._has_new_images = False
+        self._delta = DeltaIndex()
+        self._merge_timer = None
 
+        self._warm_up()
         self._initialize_index()
 
+    def _warm_up(self) -> None:
+        """
+        Run one text and one image forward pass so kernel selection and workspace
+        allocation happen at startup instead of on the first search or upload.
+        """
+        print("Warming up model...")
+        with torch.inference_mode():
+            self.model.encode(["warmup"], convert_to_tensor=True, show_progress_bar=False)
+            size = self.image_processor.image_size
+            self.image_processor.encode_pixel_values(torch.zeros(1, 3, size, size))
+
     def _initialize_index(self):
         """
         Initialize or reload the FAISS index for image similarity search.
         Processes any unprocessed images found in the gallery.
         """
-        print("\n=== Initializing Gallery ===")
+        logger.info("Initializing gallery")
         
         unprocessed_images = self.image_processor.get_unprocessed_images()
         print(f"Found {len(unprocessed_images)} unprocessed images")
@@ -86,8 +135,6 @@ class AIPhotoGallery:
                 is_initialized=True,
                 status="done"
             )
-        
-        print("=== Initialization Complete ===\n")
 
     def background_indexing(self) -> None:
         """
@@ -119,34 +166,62 @@ class AIPhotoGallery:
                 indexing_type='incremental' if self.index_path.exists() else 'full'
             )
 
-            new_embeddings = []
+            # Filled batch by batch so the index is built from one contiguous
+            # matrix instead of stacking a list of per-image vectors.
+            new_embeddings = None
+            embedded_count = 0
             new_paths = []
             
-            for i, img_path in enumerate(new_images, 1):
+            # Similar file sizes tend to mean similar resolutions, which keeps
+            # decode and resize cost even across each batch.
+            new_images = sorted(new_images, key=_file_size)
+
+            # Worker processes only pay off once there is more than one batch;
+            # small incremental updates decode on the shared thread pool.
+            if total_images > INDEX_BATCH_SIZE:
+                batches = self.image_processor.create_loader(
+                    new_images,
+                    batch_size=INDEX_BATCH_SIZE,
+                    num_workers=INDEX_NUM_WORKERS
+                )
+            else:
+                batches = [self.image_processor.load_batch(new_images, self.indexing_manager.decode_executor)]
+
+            processed_count = 0
+            for pixel_values, batch_paths, attempted in batches:
                 try:
-                    print(f"Processing image {i}/{total_images}: {img_path}")
-                    embedding = self.image_processor.process_image(img_path)
-                    new_embeddings.append(embedding)
-                    new_paths.append(str(img_path.resolve()))
-                    self.image_processor.mark_as_processed(img_path)
-                    
-                    self.indexing_manager.update_status(processed_images=i)
-
-                except Exception as e:
-                    logger.error(f"Error processing {img_path}: {e}")
-                    print(f"Error processing {img_path}: {e}")
-
-            if new_embeddings:
+                    logger.info("Processing images %d-%d/%d", processed_count + 1, processed_count + attempted, total_images)
+                    if pixel_values is not None:
+                        embeddings = self.image_processor.encode_pixel_values(pixel_values)
+                        if new_embeddings is None:
+                            new_embeddings = np.empty((total_images, embeddings.shape[1]), dtype=np.float32)
+                        new_embeddings[embedded_count:embedded_count + len(embeddings)] = embeddings
+                        embedded_count += len(embeddings)
+                        batch_resolved = [self.image_processor.resolve_path(img_path) for img_path in batch_paths]
+                        new_paths.extend(batch_resolved)
+                        self.image_processor.mark_many_as_processed(batch_resolved)
+                except Exception:
+                    logger.exception("Error processing batch starting at %s", batch_paths[0])
+
+                processed_count += attempted
+                self.indexing_manager.update_progress(processed_count)
+
+            if embedded_count:
+                new_embeddings = new_embeddings[:embedded_count]
                 with self._index_lock:
                     if not self.index_path.exists():
                         print("Creating new index...")
                         create_faiss_index(new_embeddings, new_paths, str(self.index_path))
+                        self.invalidate_index_cache()
                     else:
-                        print("Adding to existing index...")
-                        add_to_faiss_index(self.index_path, new_embeddings, new_paths)
+                        # Searched in memory until the next merge rewrites the index file
+                        print("Adding to pending index...")
+                        self._delta.add(new_embeddings, new_paths)
+                if len(self._delta) >= DELTA_MERGE_SIZE:
+                    self.merge_pending_images()
+                elif len(self._delta):
+                    self._schedule_merge()
 
-            self._last_index_update = time.time()
-            self._index_cache = None
             self.indexing_manager.update_status(
                 status="done",
                 is_initialized=True,
@@ -180,25 +255,84 @@ class AIPhotoGallery:
                 self.indexing_manager.executor.submit(self.background_indexing)
             self._has_new_images = False
 
-    def load_faiss_index(self) -> Tuple[faiss.Index, List[str]]:
+    def load_faiss_index(self) -> Tuple[faiss.Index, PathStore]:
         """
         Load the FAISS index from disk, using caching to improve performance.
+        The cached index is kept until an index write invalidates it; a missing or
+        unreadable index is not cached, so the next call tries the file again.
 
         Returns:
-            Tuple[faiss.Index, List[str]]: The loaded FAISS index and a list of associated image paths.
+            Tuple[faiss.Index, PathStore]: The loaded FAISS index and the store of its image paths.
         """
         with self._index_lock:
             try:
-                if self._index_cache is None or time.time() - self._last_index_update > 300:
-                    self._index_cache = load_faiss_index(self.index_path)
-                    self._last_index_update = time.time()
+                if self._index_cache is None:
+                    index, path_store = load_faiss_index(self.index_path)
+                    if USE_GPU and index is not None and index.ntotal >= GPU_INDEX_THRESHOLD and gpu_available():
+                        index = index_to_gpu(index, self._get_gpu_resources())
+                    if index is None:
+                        return None, None
+                    self._index_cache = (index, path_store)
                 return self._index_cache
             except Exception as e:
                 print(f"Error loading index: {e}")
-                if not self.index_path.exists() or not Path(str(self.index_path) + '.paths').exists():
+                if not self.index_path.exists():
                     print("Index files missing, starting indexing...")
                     self.start_indexing()
-                return None, []
+                return None, None
+
+    def merge_pending_images(self) -> None:
+        """
+        Write the images buffered in the delta index into the index file with a single update.
+        """
+        try:
+            with self._index_lock:
+                vectors, paths = self._delta.snapshot()
+                if not paths:
+                    return
+                print(f"Merging {len(paths)} pending images into the index...")
+                add_to_faiss_index(self.index_path, vectors, paths)
+                self._delta.discard(len(paths))
+                self.invalidate_index_cache()
+        except Exception as e:
+            logger.error(f"Merge error: {e}")
+            print(f"Merge error: {e}")
+
+    def _schedule_merge(self) -> None:
+        """Queue a merge of the pending images on the indexing executor after DELTA_MERGE_INTERVAL seconds."""
+        if self._merge_timer is not None and self._merge_timer.is_alive():
+            return
+        self._merge_timer = threading.Timer(
+            DELTA_MERGE_INTERVAL,
+            lambda: self.indexing_manager.executor.submit(self.merge_pending_images)
+        )
+        self._merge_timer.daemon = True
+        self._merge_timer.start()
+
+    def index_version(self) -> Tuple[int, int]:
+        """
+        Identify the current searchable contents for caching search results.
+
+        Returns:
+            Tuple[int, int]: Modification time of the index file in nanoseconds and the number of pending images.
+        """
+        return self.index_path.stat().st_mtime_ns, len(self._delta)
+
+    def invalidate_index_cache(self) -> None:
+        """Drop the cached index so the next search reloads it from disk. Call after any index write or delete."""
+        self._index_cache = None
+
+    def _get_gpu_resources(self) -> "faiss.StandardGpuResources":
+        """
+        Get the GPU resources used for searching, allocating them on first use.
+
+        Returns:
+            faiss.StandardGpuResources: Resources shared by every GPU copy of the index.
+        """
+        if self._gpu_resources is None:
+            self._gpu_resources = faiss.StandardGpuResources()
+            self._gpu_resources.setTempMemory(64 * 1024 * 1024)
+        return self._gpu_resources
 
     def retrieve_similar_images(self, query: str, top_k: int = 12) -> Tuple[str, List[str]]:
         """
@@ -212,16 +346,44 @@ class AIPhotoGallery:
             Tuple[str, List[str]]: A tuple containing the query and a list of similar image paths.
         """
         try:
-            index_data = self.load_faiss_index()
-            if index_data is None or index_data[1] == []:
+            index, path_store = self.load_faiss_index()
+            if index is None or not path_store:
                 print("No valid index found, returning empty results")
                 return query, []
-            index, image_paths = index_data
-            return retrieve_similar_images(query, self.model, index, image_paths, top_k)
+            with torch.inference_mode():
+                return retrieve_similar_images(
+                    query, self.model, index, path_store, top_k, self._delta, self.image_processor.encode_images
+                )
         except Exception as e:
             print(f"Error retrieving similar images: {e}")
             return query, []
 
+    def retrieve_similar_images_batch(self, queries: List[str], top_k: int = 12) -> List[List[str]]:
+        """
+        Find images similar to several text queries with a single encode and search.
+        Unlike retrieve_similar_images, failures are raised rather than returned as empty
+        results, so callers caching the results never cache an error.
+        
+        Args:
+            queries (List[str]): Natural language queries to search for
+            top_k (int): Number of similar images to return per query
+            
+        Returns:
+            List[List[str]]: Similar image paths for each query, in query order
+            
+        Raises:
+            RuntimeError: If the index or its path store could not be loaded
+        """
+        index, path_store = self.load_faiss_index()
+        if index is None or path_store is None:
+            raise RuntimeError("Could not load the index")
+        if not path_store:
+            return [[] for _ in queries]
+        with torch.inference_mode():
+            return retrieve_similar_images_batch(
+                queries, self.model, index, path_store, top_k, self._delta, self.image_processor.encode_images
+            )
+
     def has_new_images(self) -> bool:
         """Check if there are new unprocessed images in the gallery.
 
@@ -2,6 +2,7 @@
 Manages the indexing process for the image gallery.
 Handles tracking of indexing status, processed images, and concurrent indexing operations.
 """
+import os
 import threading
 from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Set
@@ -28,6 +29,7 @@ class IndexingManager:
         }
         self._lock = threading.Lock()
         self.executor = ThreadPoolExecutor(max_workers=1)
+        self.decode_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="decode")
         self._index_path = Path("Index/vector.index")
         self._processed_images: Set[str] = set()
         self._last_index_time = 0
@@ -42,6 +44,17 @@ class IndexingManager:
         with self._lock:
             self.status.update(kwargs)
 
+    def update_progress(self, processed_images: int) -> None:
+        """
+        Update the processed image count without taking the status lock.
+        Only the indexing thread writes this counter, and a single dict item
+        assignment is atomic under the GIL, so readers never see a torn value.
+        
+        Args:
+            processed_images (int): Number of images processed so far
+        """
+        self.status["processed_images"] = processed_images
+
     def get_status(self) -> Dict:
         """
         Get a thread-safe copy of the current indexing status.
@@ -77,17 +90,31 @@ class IndexingManager:
             
             return False
 
+    @staticmethod
+    def _resolve(image_path: str) -> str:
+        """
+        Normalize an image path for the processed set.
+        Absolute string paths are taken as already resolved and skip the realpath syscall.
+        
+        Args:
+            image_path (str): Path to normalize
+            
+        Returns:
+            str: Resolved path
+        """
+        if isinstance(image_path, str) and os.path.isabs(image_path):
+            return image_path
+        return str(Path(image_path).resolve())
+
     def mark_image_processed(self, image_path: str) -> None:
         """
-        Mark an image as processed in a thread-safe manner.
+        Mark an image as processed. set.add is atomic under the GIL, so no lock is needed.
         
         Args:
             image_path (str): Path to the processed image
         """
-        with self._lock:
-            resolved_path = str(Path(image_path).resolve())
-            self._processed_images.add(resolved_path)
-            self._last_index_time = time.time()
+        self._processed_images.add(self._resolve(image_path))
+        self._last_index_time = time.time()
 
     def is_image_processed(self, image_path: str) -> bool:
         """
@@ -99,9 +126,7 @@ class IndexingManager:
         Returns:
             bool: True if image has been processed, False otherwise
         """
-        with self._lock:
-            resolved_path = str(Path(image_path).resolve())
-            return resolved_path in self._processed_images
+        return self._resolve(image_path) in self._processed_images
 
     def add_new_images(self, count: int) -> None:
         """
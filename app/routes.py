@@ -3,15 +3,81 @@ FastAPI routes for the Image Search application.
 
 Handles endpoints for image upload, search, and gallery management.
 """
+import asyncio
+import functools
+import logging
+from string import Template
 from fastapi import File, UploadFile, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse
 from pydantic import BaseModel
-from typing import List
-from pathlib import Path
+from typing import List, Optional, Tuple
 from . import app, templates
+from .config import SEARCH_BATCH_SIZE, SEARCH_BATCH_WINDOW_MS
 from .models.gallery import AIPhotoGallery
+from .utils.query_batcher import QueryBatcher
 
-gallery = AIPhotoGallery()
+logger = logging.getLogger(__name__)
+
+# Created in the background after startup so model and hash loading block neither import nor serving.
+gallery: Optional[AIPhotoGallery] = None
+_gallery_task: Optional[asyncio.Task] = None
+_search_batcher: Optional[QueryBatcher] = None
+# Set when loading the gallery raised, so requests report the failure instead of waiting forever.
+_gallery_error: Optional[str] = None
+
+async def _load_gallery():
+    """Load the model and gallery on a worker thread."""
+    global gallery, _search_batcher
+    loaded = await run_in_threadpool(AIPhotoGallery)
+    _search_batcher = QueryBatcher(
+        functools.partial(loaded.retrieve_similar_images_batch, top_k=12),
+        window=SEARCH_BATCH_WINDOW_MS / 1000,
+        max_batch_size=SEARCH_BATCH_SIZE
+    )
+    gallery = loaded
+
+def _on_gallery_loaded(task: asyncio.Task) -> None:
+    """Log and record a failure of the gallery loading task.
+
+    Args:
+        task (asyncio.Task): The finished loading task.
+    """
+    global _gallery_error
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error("Gallery failed to load", exc_info=error)
+        _gallery_error = f"{type(error).__name__}: {error}"
+
+@app.on_event("startup")
+async def start_loading_gallery():
+    """Start loading the gallery without delaying server startup."""
+    global _gallery_task
+    _gallery_task = asyncio.create_task(_load_gallery())
+    _gallery_task.add_done_callback(_on_gallery_loaded)
+
+@app.on_event("shutdown")
+async def merge_pending_images():
+    """Write images still buffered in memory into the index file before the server exits."""
+    if gallery is not None:
+        await run_in_threadpool(gallery.merge_pending_images)
+
+def get_gallery() -> AIPhotoGallery:
+    """Get the loaded gallery.
+
+    Returns:
+        AIPhotoGallery: The application's gallery.
+
+    Raises:
+        HTTPException: 500 if loading the gallery failed, 503 while it is still loading.
+    """
+    if _gallery_error is not None:
+        raise HTTPException(status_code=500, detail=f"Gallery failed to load: {_gallery_error}")
+    if gallery is None:
+        raise HTTPException(status_code=503, detail="Gallery is still loading, please retry shortly")
+    return gallery
 
 class SearchQuery(BaseModel):
     """Data model for search queries.
@@ -30,6 +96,21 @@ async def home(request: Request):
     """
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/health")
+async def health():
+    """Report whether the server is up and the gallery has finished loading.
+
+    Returns:
+        dict: A dictionary containing the server status and gallery readiness,
+            sent with status 500 and the error if loading the gallery failed.
+    """
+    if _gallery_error is not None:
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "gallery_ready": False, "error": _gallery_error}
+        )
+    return {"status": "ok", "gallery_ready": gallery is not None}
+
 @app.post("/init")
 async def init_gallery():
     """Initialize the image gallery and start indexing if needed.
@@ -40,6 +121,7 @@ async def init_gallery():
     Raises:
         HTTPException: If an error occurs during initialization.
     """
+    gallery = get_gallery()
     try:
         status = gallery.indexing_manager.get_status()
         
@@ -58,7 +140,25 @@ async def get_indexing_status():
     Returns:
         dict: A dictionary containing the indexing status.
     """
-    return gallery.indexing_manager.get_status()
+    return get_gallery().indexing_manager.get_status()
+
+def _save_upload(gallery: AIPhotoGallery, file: UploadFile) -> Tuple[str, str]:
+    """
+    Save a single uploaded file. Runs on a worker thread so uploads are hashed and written concurrently.
+
+    Args:
+        gallery (AIPhotoGallery): The gallery receiving the file.
+        file (UploadFile): The uploaded file.
+
+    Returns:
+        Tuple[str, str]: ("uploaded", saved path) or ("skipped", original filename) for duplicates.
+    """
+    try:
+        return "uploaded", str(gallery.image_processor.save_uploaded_file(file))
+    except ValueError as e:
+        if "already been uploaded" in str(e):
+            return "skipped", file.filename
+        raise
 
 @app.post("/upload")
 async def upload(files: List[UploadFile] = File(...)):
@@ -75,23 +175,23 @@ async def upload(files: List[UploadFile] = File(...)):
     Raises:
         HTTPException: If no valid files are uploaded or if an error occurs during the upload process.
     """
+    gallery = get_gallery()
     uploaded_files = []
     skipped_files = []
     
     try:
-        for file in files:
-            try:
-                if gallery.image_processor.is_duplicate(file):
-                    skipped_files.append(file.filename)
-                    continue
-                
-                file_path = gallery.image_processor.save_uploaded_file(file)
-                uploaded_files.append(str(file_path))
-            except ValueError as e:
-                if "already been uploaded" in str(e):
-                    skipped_files.append(file.filename)
-                else:
-                    raise
+        results = await asyncio.gather(
+            *(run_in_threadpool(_save_upload, gallery, file) for file in files),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+            outcome, name = result
+            if outcome == "uploaded":
+                uploaded_files.append(name)
+            else:
+                skipped_files.append(name)
         
         message_parts = []
         if uploaded_files:
@@ -115,6 +215,65 @@ async def upload(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Markup for a single search result, compiled once at import.
+_GALLERY_ITEM_TEMPLATE = Template("""
+                <div class="gallery-item" data-path="$url">
+                    <div class="gallery-item-content" style="opacity: 0">
+                        <img src="$url" 
+                             alt="Gallery image $number" 
+                             loading="lazy"
+                             onload="this.parentElement.style.opacity = '1';">
+                        <div class="gallery-item-overlay">
+                            <span class="mdi mdi-eye"></span>
+                        </div>
+                    </div>
+                    <div class="gallery-item-loading">
+                        <div class="loading-spinner"></div>
+                    </div>
+                </div>
+            """)
+
+def _image_url(img_path: str) -> Optional[str]:
+    """
+    Get the URL an indexed image is served from.
+
+    Args:
+        img_path (str): Absolute path of the image.
+
+    Returns:
+        Optional[str]: URL under /images/, or None if the path cannot be mapped into the gallery.
+    """
+    try:
+        return f"/images/{gallery.image_processor.get_relative_path(img_path).as_posix()}"
+    except Exception as e:
+        logger.debug("Error processing image %s: %s", img_path, e)
+        return None
+
+@functools.lru_cache(maxsize=512)
+def _render_search_results(query: str, index_version: Tuple[int, int]) -> str:
+    """
+    Run a search and render the matching images as gallery HTML.
+    Cached by query and index version, so repeated queries skip the model and FAISS
+    until the index is rewritten or new images are added. Uncached queries go through the
+    search batcher, which encodes and searches concurrent requests together. Search errors
+    propagate, so lru_cache never stores a failed search.
+
+    Args:
+        query (str): The search query string.
+        index_version (Tuple[int, int]): Version of the searchable contents, from gallery.index_version().
+
+    Returns:
+        str: HTML markup for the matching gallery items.
+    """
+    retrieved_images = _search_batcher.search(query)
+    
+    logger.debug("Retrieved images count: %d", len(retrieved_images) if retrieved_images else 0)
+    
+    urls = [url for url in map(_image_url, retrieved_images) if url is not None]
+    return "".join(
+        _GALLERY_ITEM_TEMPLATE.substitute(url=url, number=i + 1) for i, url in enumerate(urls)
+    )
+
 @app.post("/search")
 async def search(query: SearchQuery):
     """
@@ -130,46 +289,15 @@ async def search(query: SearchQuery):
     Raises:
         HTTPException: If an error occurs during the search process.
     """
+    gallery = get_gallery()
     try:
-        print("Starting search...")
+        logger.debug("Starting search for %r", query.query)
         if not gallery.index_path.exists():
             return {'html': '<div class="error">No index found. Please upload some images first.</div>'}
-            
-        _, retrieved_images = gallery.retrieve_similar_images(query.query, top_k=12)
-        
-        print(f"Retrieved images count: {len(retrieved_images) if retrieved_images else 0}")
-        
-        gallery_html = []
-        for i, img_path in enumerate(retrieved_images):
-            try:
-                relative_path = gallery.image_processor.get_relative_path(img_path)
-                url_path = f"/images/{relative_path.as_posix()}"
-                
-                gallery_html.append(f"""
-                    <div class="gallery-item" data-path="{url_path}">
-                        <div class="gallery-item-content" style="opacity: 0">
-                            <img src="{url_path}" 
-                                 alt="Gallery image {i+1}" 
-                                 loading="lazy"
-                                 onload="this.parentElement.style.opacity = '1';">
-                            <div class="gallery-item-overlay">
-                                <span class="mdi mdi-eye"></span>
-                            </div>
-                        </div>
-                        <div class="gallery-item-loading">
-                            <div class="loading-spinner"></div>
-                        </div>
-                    </div>
-                """)
-            except Exception as e:
-                print(f"Error processing image {i+1} ({img_path}): {e}")
-                continue
         
-        final_html = "".join(gallery_html)
-        return {'html': final_html}
+        html = await run_in_threadpool(_render_search_results, query.query, gallery.index_version())
+        return {'html': html}
     
     except Exception as e:
-        print(f"Search error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Search error")
         raise HTTPException(status_code=500, detail=str(e))
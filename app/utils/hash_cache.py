@@ -0,0 +1,81 @@
+"""
+SQLite-backed cache of image content hashes.
+Lets startup skip rehashing files whose modification time and size are unchanged.
+"""
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+class HashCache:
+    """
+    Persists the content hash of each image keyed by its resolved path.
+    Entries record the file's mtime and size so stale hashes can be detected with a single stat call.
+    """
+
+    def __init__(self, db_path: Union[str, Path], algorithm: str):
+        """
+        Open the cache, creating the database on first use.
+
+        Args:
+            db_path (Union[str, Path]): Path to the SQLite database file
+            algorithm (str): Name of the hash algorithm; entries made with another algorithm are ignored
+        """
+        self.db_path = Path(db_path)
+        self.algorithm = algorithm
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes "
+                "(path TEXT PRIMARY KEY, mtime REAL, size INTEGER, algorithm TEXT, digest TEXT, phash TEXT)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(hashes)")}
+            if "phash" not in columns:
+                conn.execute("ALTER TABLE hashes ADD COLUMN phash TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection that commits on success and is always closed."""
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self) -> Dict[str, Tuple[float, int, bytes, Optional[int]]]:
+        """
+        Load every cached entry made with the current algorithm.
+
+        Returns:
+            Dict[str, Tuple[float, int, bytes, Optional[int]]]: Mapping of path to
+                (mtime, size, digest, phash); phash is None when it was never computed
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT path, mtime, size, digest, phash FROM hashes WHERE algorithm = ?", (self.algorithm,)
+            )
+            return {
+                path: (mtime, size, bytes.fromhex(digest), int(phash, 16) if phash is not None else None)
+                for path, mtime, size, digest, phash in rows
+            }
+
+    def store(self, entries: Iterable[Tuple[str, float, int, bytes, Optional[int]]]) -> None:
+        """
+        Insert or update cache entries in a single transaction.
+        Digests are kept as hex text on disk so existing databases stay readable.
+
+        Args:
+            entries (Iterable[Tuple[str, float, int, bytes, Optional[int]]]):
+                (path, mtime, size, digest, phash) tuples
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO hashes (path, mtime, size, algorithm, digest, phash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (path, mtime, size, self.algorithm, digest.hex(), f"{phash:016x}" if phash is not None else None)
+                    for path, mtime, size, digest, phash in entries
+                )
+            )
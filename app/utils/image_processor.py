@@ -2,18 +2,178 @@
 Utility module for processing and managing images in the gallery.
 Handles image validation, deduplication, storage, and embedding generation.
 """
+import functools
 import hashlib
+import logging
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Set
-from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 from PIL import Image
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
 from sentence_transformers import SentenceTransformer
 import shutil
+import threading
+import uuid
+from app.utils.hash_cache import HashCache
+from app.utils.search import get_path_store
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import imagehash
+    import pybktree
+except ImportError:
+    imagehash = None
+    pybktree = None
+
+logger = logging.getLogger(__name__)
+
+# Chunk size used when streaming file contents into the hasher.
+_HASH_CHUNK_SIZE = 1 << 20
+
+# Size JPEGs are draft-decoded to before perceptual hashing; pHash itself works on a 32x32 thumbnail.
+_PHASH_DRAFT_SIZE = (64, 64)
+
+# Largest Hamming distance between perceptual hashes still treated as the same image.
+_PHASH_MAX_DISTANCE = 4
+
+# Name recorded with cached hashes so a change of algorithm invalidates them.
+HASH_ALGORITHM = "blake3" if blake3 is not None else "sha256"
+
+def _new_hasher():
+    """
+    Create the hasher used for duplicate detection.
+    BLAKE3 (SIMD, multithreaded) is used when installed; SHA-256 is the fallback.
+    """
+    if blake3 is not None:
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    return hashlib.sha256()
+
+def hash_fileobj(fileobj) -> bytes:
+    """
+    Hash a binary file object from its current position to the end.
+    Uses hashlib.file_digest (Python 3.11+), which reads into a reused buffer
+    instead of allocating a bytes object per chunk.
+    
+    Args:
+        fileobj: Binary file object to hash
+        
+    Returns:
+        bytes: Raw digest of the remaining contents
+    """
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(fileobj, _new_hasher).digest()
+    hasher = _new_hasher()
+    for chunk in iter(lambda: fileobj.read(_HASH_CHUNK_SIZE), b''):
+        hasher.update(chunk)
+    return hasher.digest()
+
+def hash_path(path: Path) -> bytes:
+    """
+    Hash the contents of a file on disk.
+    BLAKE3 hashes the memory-mapped file directly; the fallback streams it through hash_fileobj.
+    
+    Args:
+        path (Path): File to hash
+        
+    Returns:
+        bytes: Raw digest of the file contents
+    """
+    if blake3 is not None:
+        hasher = _new_hasher()
+        hasher.update_mmap(path)
+        return hasher.digest()
+    with open(path, 'rb') as f:
+        return hash_fileobj(f)
+
+def _hamming(a: int, b: int) -> int:
+    """Number of differing bits between two perceptual hashes."""
+    return bin(a ^ b).count("1")
+
+def phash_image(source) -> Optional[int]:
+    """
+    Compute the 64-bit DCT perceptual hash of an image.
+    Unlike the content hash it survives re-encoding, resizing and small edits.
+    
+    Args:
+        source: Path or file-like object of the image
+        
+    Returns:
+        Optional[int]: Perceptual hash, or None if imagehash is not installed or the image cannot be decoded
+    """
+    if imagehash is None:
+        return None
+    try:
+        with Image.open(source) as image:
+            image.draft("RGB", _PHASH_DRAFT_SIZE)
+            return int(str(imagehash.phash(image)), 16)
+    except Exception as e:
+        logger.debug("Error computing perceptual hash: %s", e)
+        return None
+
+class ImageDataset(Dataset):
+    """
+    Dataset that decodes and preprocesses gallery images for batched encoding.
+    Images that fail to decode yield None so a single bad file does not stop the loader.
+    JPEGs are decoded at a reduced scale when a draft size is given.
+    """
+
+    def __init__(self, image_paths: List[Path], transform: Callable, draft_size: Optional[Tuple[int, int]] = None):
+        """
+        Initialize the dataset.
+        
+        Args:
+            image_paths (List[Path]): Paths of the images to load
+            transform (Callable): Transform turning a PIL image into a tensor
+            draft_size (Optional[Tuple[int, int]]): Smallest size JPEGs may be draft-decoded to
+        """
+        self.image_paths = list(image_paths)
+        self.transform = transform
+        self.draft_size = draft_size
+
+    def __len__(self) -> int:
+        return len(self.image_paths)
+
+    def __getitem__(self, idx: int) -> Optional[Tuple[torch.Tensor, str]]:
+        image_path = self.image_paths[idx]
+        try:
+            with Image.open(image_path) as image:
+                if self.draft_size is not None:
+                    image.draft("RGB", self.draft_size)
+                return self.transform(image.convert("RGB")), str(image_path)
+        except Exception as e:
+            logger.debug("Error processing %s: %s", image_path, e)
+            return None
+
+def collate_images(samples: List[Optional[Tuple[torch.Tensor, str]]]) -> Tuple[Optional[torch.Tensor], List[Path], int]:
+    """
+    Collate dataset samples into a batch, dropping images that failed to load.
+    
+    Args:
+        samples (List[Optional[Tuple[torch.Tensor, str]]]): Samples produced by ImageDataset
+        
+    Returns:
+        Tuple[Optional[torch.Tensor], List[Path], int]: Stacked tensors (None if every image failed),
+            their paths and the number of samples attempted
+    """
+    loaded = [sample for sample in samples if sample is not None]
+    if not loaded:
+        return None, [], len(samples)
+    tensors, paths = zip(*loaded)
+    return torch.stack(tensors), [Path(p) for p in paths], len(samples)
 
 class ImageProcessor:
     """
     Handles image processing operations including file management and embedding generation.
-    Maintains a record of processed images and prevents duplicates using MD5 hashing.
+    Maintains a record of processed images and prevents duplicates using content hashing.
     """
     
     SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
@@ -29,78 +189,148 @@ class ImageProcessor:
         self.base_path = Path(base_path)
         self.model = model
         self.base_path.mkdir(parents=True, exist_ok=True)
-        self._image_hashes: Set[str] = set()
-        self._processed_paths: Set[str] = set()
+        self._base_resolved = self.base_path.resolve()
+        self._relative_path_cache = functools.lru_cache(maxsize=4096)(self._compute_relative_path)
+        self._image_hashes: Set[bytes] = set()
+        self._phash_tree = pybktree.BKTree(_hamming) if pybktree is not None else None
+        self._hash_lock = threading.Lock()
+        self._processed_files: Set[Tuple[int, int, int, int]] = set()
+        self._clip = model[0].model
+        self._transform = self._build_transform()
+        self._onnx_session = None
+        self._hash_cache = HashCache(Path("Index/hash_cache.sqlite"), HASH_ALGORITHM)
         self._load_existing_hashes()
 
+    def _build_transform(self) -> transforms.Compose:
+        """
+        Build the preprocessing pipeline used for batched image encoding.
+        Mirrors the resize, crop and normalization settings of the model's CLIP processor.
+        
+        Returns:
+            transforms.Compose: Transform turning a PIL image into a normalized tensor
+        """
+        clip_processor = self.model[0].processor.image_processor
+        crop_size = clip_processor.crop_size
+        if isinstance(crop_size, dict):
+            crop_size = crop_size["height"]
+        self.image_size = crop_size
+        # JPEGs are decoded at the smallest DCT scale still twice the crop size, keeping resampling quality.
+        self.draft_size = (2 * crop_size, 2 * crop_size)
+        return transforms.Compose([
+            transforms.Resize(crop_size, interpolation=transforms.InterpolationMode.BICUBIC),
+            transforms.CenterCrop(crop_size),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=clip_processor.image_mean, std=clip_processor.image_std),
+        ])
+
     def _load_existing_hashes(self):
-        """Load hashes of existing images from the index and base directory."""
-        self._processed_paths.clear()
+        """
+        Load hashes of existing images from the index and base directory.
+        Hashes are taken from the hash cache when a file's mtime and size are unchanged;
+        the remaining files are read and hashed concurrently on a thread pool.
+        Perceptual hashes are collected into a BK-tree for near-duplicate lookups.
+        """
+        self._processed_files.clear()
         self._image_hashes.clear()
         
-        index_paths_file = Path("Index/vector.index.paths")
-        if index_paths_file.exists():
+        cached_hashes = self._hash_cache.load()
+        cache_updates = []
+        phashes = []
+        
+        def record(results) -> List[Tuple[int, int, int, int]]:
+            file_keys = []
+            for file_key, file_hash, phash, cache_entry in results:
+                if file_key is None:
+                    continue
+                file_keys.append(file_key)
+                self._image_hashes.add(file_hash)
+                if phash is not None:
+                    phashes.append(phash)
+                if cache_entry is not None:
+                    cache_updates.append(cache_entry)
+            return file_keys
+        
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def hash_all(items):
+                return executor.map(lambda item: self._hash_one(item[0], item[1], cached_hashes), items)
+            
+            # Indexed paths are stored resolved; files that no longer exist simply fail to stat while hashing.
+            path_store = get_path_store(Path("Index/vector.index"))
             print("\nLoading existing index paths...")
-            with open(index_paths_file, 'r') as f:
-                for line in f:
-                    path = Path(line.strip())
-                    if path.exists():
-                        self._processed_paths.add(str(path.resolve()))
-                        try:
-                            with open(path, 'rb') as img_file:
-                                file_hash = hashlib.md5(img_file.read()).hexdigest()
-                                self._image_hashes.add(file_hash)
-                        except Exception as e:
-                            print(f"Error loading hash for indexed path {path}: {e}")
-            print(f"Loaded {len(self._processed_paths)} paths from index")
-        else:
-            print("\nNo existing index paths file found")
+            indexed = [(Path(indexed_path), str(Path(indexed_path))) for indexed_path in path_store.all_paths()]
+            self._processed_files.update(record(hash_all(indexed)))
+            print(f"Loaded {len(self._processed_files)} paths from index")
 
-        print("\nScanning base path for images...")
-        for img_path in self.get_all_images():
-            try:
-                resolved_path = str(img_path.resolve())
-                if resolved_path not in self._processed_paths:
-                    with open(img_path, 'rb') as f:
-                        file_hash = hashlib.md5(f.read()).hexdigest()
-                        if file_hash not in self._image_hashes:
-                            self._image_hashes.add(file_hash)
-            except Exception as e:
-                print(f"Error loading hash for {img_path}: {e}")
+            print("\nScanning base path for images...")
+            unindexed = [
+                (img_path, self.resolve_path(img_path)) for img_path in self.get_all_images()
+                if self._file_key(img_path) not in self._processed_files
+            ]
+            record(hash_all(unindexed))
+
+        if cache_updates:
+            self._hash_cache.store(cache_updates)
+        if pybktree is not None:
+            self._phash_tree = pybktree.BKTree(_hamming, phashes)
 
+        print(f"Hashed {len(cache_updates)} new or changed images")
         print(f"Total unique image hashes: {len(self._image_hashes)}")
-        print(f"Total processed paths: {len(self._processed_paths)}\n")
+        print(f"Total processed paths: {len(self._processed_files)}\n")
 
-    def _get_file_hash(self, file) -> str:
+    def _hash_one(self, path: Path, resolved_path: str,
+                  cached_hashes: Dict[str, Tuple[float, int, bytes, Optional[int]]]):
         """
-        Calculate MD5 hash of a file.
+        Get the content hash and perceptual hash of a file, reusing cached values when the file is unchanged.
+        Safe to call from worker threads; hashing releases the GIL.
         
         Args:
-            file: File-like object to hash
+            path (Path): File to hash
+            resolved_path (str): Resolved path used as the cache key
+            cached_hashes (Dict[str, Tuple[float, int, bytes, Optional[int]]]): Entries loaded from the hash cache
             
         Returns:
-            str: MD5 hash of the file
+            Tuple: The _file_key of the file (everything is None if it could not be read),
+                the raw digest, the perceptual hash, and a cache entry to store when anything had to be recomputed
         """
-        content = file.file.read()
-        file.file.seek(0)
-        return hashlib.md5(content).hexdigest()
+        try:
+            stat = path.stat()
+            file_key = self._stat_key(stat)
+            cached = cached_hashes.get(resolved_path)
+            if cached is not None and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+                file_hash, phash = cached[2], cached[3]
+                if phash is not None or imagehash is None:
+                    return file_key, file_hash, phash, None
+            else:
+                file_hash = hash_path(path)
+            
+            phash = phash_image(path)
+            entry = (resolved_path, stat.st_mtime, stat.st_size, file_hash, phash)
+            return file_key, file_hash, phash, entry
+        except Exception as e:
+            logger.debug("Error loading hash for %s: %s", path, e)
+            return None, None, None, None
 
-    def is_duplicate(self, file) -> bool:
+    def _is_near_duplicate(self, phash: Optional[int]) -> bool:
         """
-        Check if a file is a duplicate based on its hash.
+        Check whether a perceptual hash is within _PHASH_MAX_DISTANCE of a known image.
         
         Args:
-            file: File to check
+            phash (Optional[int]): Perceptual hash of the candidate image
             
         Returns:
-            bool: True if the file is a duplicate
+            bool: True if a visually identical image is already in the gallery
         """
-        file_hash = self._get_file_hash(file)
-        return file_hash in self._image_hashes
+        if phash is None or self._phash_tree is None:
+            return False
+        return bool(self._phash_tree.find(phash, _PHASH_MAX_DISTANCE))
 
     def save_uploaded_file(self, file) -> Path:
         """
         Save an uploaded file to the gallery directory.
+        The upload is streamed to a hidden temporary file and only renamed into place once it
+        passes the duplicate checks, so rejected uploads never appear under a gallery name.
+        Safe to call concurrently: the duplicate check, hash registration and name claim happen under a lock.
         
         Args:
             file: Uploaded file to save
@@ -114,87 +344,254 @@ class ImageProcessor:
         if not file or not file.filename:
             raise ValueError("Invalid file")
 
-        if self.is_duplicate(file):
-            raise ValueError("This image has already been uploaded")
-
         clean_filename = Path(file.filename).name
-        file_path = self.base_path / clean_filename
-        
-        counter = 1
-        while file_path.exists():
-            stem = Path(clean_filename).stem
-            suffix = Path(clean_filename).suffix
-            file_path = self.base_path / f"{stem}_{counter}{suffix}"
-            counter += 1
+        temp_path = self.base_path / f".{clean_filename}.{uuid.uuid4().hex}.tmp"
 
-        file_content = file.file.read()
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        
-        file_hash = hashlib.md5(file_content).hexdigest()
-        self._image_hashes.add(file_hash)
+        try:
+            hasher = _new_hasher()
+            with open(temp_path, 'xb') as f:
+                for chunk in iter(lambda: file.file.read(_HASH_CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+                    f.write(chunk)
+            
+            file_hash = hasher.digest()
+            phash = phash_image(temp_path)
+            
+            with self._hash_lock:
+                if file_hash in self._image_hashes:
+                    raise ValueError("This image has already been uploaded")
+                if self._is_near_duplicate(phash):
+                    raise ValueError("A near-identical image has already been uploaded")
+                
+                file_path = self._claim_upload_path(clean_filename)
+                try:
+                    os.replace(temp_path, file_path)
+                except OSError:
+                    file_path.unlink(missing_ok=True)
+                    raise
+                self._image_hashes.add(file_hash)
+                if phash is not None:
+                    self._phash_tree.add(phash)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        stat = file_path.stat()
+        self._hash_cache.store([(str(file_path.resolve()), stat.st_mtime, stat.st_size, file_hash, phash)])
 
         return file_path
 
+    def _claim_upload_path(self, filename: str) -> Path:
+        """
+        Reserve a free name for an upload in the gallery directory.
+        Names are claimed with exclusive creation, adding _1, _2, ... to the stem until one is free.
+        
+        Args:
+            filename (str): Name the file was uploaded with
+            
+        Returns:
+            Path: Path of the newly created, empty placeholder file
+        """
+        file_path = self.base_path / filename
+        counter = 1
+        while True:
+            try:
+                open(file_path, 'xb').close()
+                return file_path
+            except FileExistsError:
+                stem = Path(filename).stem
+                suffix = Path(filename).suffix
+                file_path = self.base_path / f"{stem}_{counter}{suffix}"
+                counter += 1
+
     def get_all_images(self) -> List[Path]:
         """
         Get paths of all supported image files in the gallery.
+        Walks the tree with os.scandir and filters on the entry name, so no Path is built for other files.
+        Directories and entries that cannot be read are skipped.
         
         Returns:
             List[Path]: List of paths to all images
         """
-        all_files = list(self.base_path.rglob('*'))
-        print(f"Found {len(all_files)} total files in {self.base_path}")
-        
-        images = [
-            p for p in all_files
-            if p.suffix.lower() in self.SUPPORTED_FORMATS
-            and not p.name.startswith('.')
-        ]
+        images = []
+        total_files = 0
+        pending_dirs = [str(self.base_path)]
+        while pending_dirs:
+            directory = pending_dirs.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError as e:
+                logger.debug("Error scanning %s: %s", directory, e)
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError as e:
+                        logger.debug("Error reading %s: %s", entry.path, e)
+                        continue
+                    if is_dir:
+                        pending_dirs.append(entry.path)
+                        continue
+                    total_files += 1
+                    if (not entry.name.startswith('.')
+                            and os.path.splitext(entry.name)[1].lower() in self.SUPPORTED_FORMATS):
+                        images.append(Path(entry.path))
+        print(f"Found {total_files} total files in {self.base_path}")
         
         print(f"Of which {len(images)} are supported images: {self.SUPPORTED_FORMATS}")
         return images
 
-    def process_image(self, image_path: Path):
+    def encode_images(self, images: List[Image.Image]) -> np.ndarray:
         """
-        Generate embedding for an image using the model.
+        Generate embeddings for already opened images, such as image search queries.
+        Goes through the same preprocessing and encode_pixel_values path as indexing, so the
+        pixel values match the model's dtype when it runs in half precision.
         
         Args:
-            image_path (Path): Path to the image
+            images (List[Image.Image]): Images to embed
             
         Returns:
-            np.ndarray: Image embedding
+            np.ndarray: L2-normalized float32 image embeddings
+        """
+        pixel_values = torch.stack([self._transform(image.convert("RGB")) for image in images])
+        return self.encode_pixel_values(pixel_values)
+
+    def load_batch(self, image_paths: List[Path], executor: Optional[Executor] = None) -> Tuple[Optional[torch.Tensor], List[Path], int]:
+        """
+        Decode and preprocess a batch of images, optionally spreading decode over a thread pool.
+        Pillow releases the GIL while decoding, so threads decode in parallel without spawning processes.
+        
+        Args:
+            image_paths (List[Path]): Paths to the images
+            executor (Optional[Executor]): Pool used to decode images concurrently
+            
+        Returns:
+            Tuple[Optional[torch.Tensor], List[Path], int]: Same batch format as the DataLoader from create_loader
+        """
+        dataset = ImageDataset(image_paths, self._transform, self.draft_size)
+        indices = range(len(dataset))
+        if executor is not None:
+            samples = list(executor.map(dataset.__getitem__, indices))
+        else:
+            samples = [dataset[i] for i in indices]
+        return collate_images(samples)
+
+    def create_loader(self, image_paths: List[Path], batch_size: int, num_workers: int) -> DataLoader:
+        """
+        Create a DataLoader that decodes images in worker processes while the model encodes.
+        
+        Args:
+            image_paths (List[Path]): Paths of the images to load, in batching order
+            batch_size (int): Number of images per batch
+            num_workers (int): Number of decode worker processes (0 decodes in the calling thread)
+            
+        Returns:
+            DataLoader: Loader yielding (pixel_values, paths, attempted_count) batches
+        """
+        loader_kwargs = {}
+        if num_workers > 0:
+            loader_kwargs["prefetch_factor"] = 4
+        return DataLoader(
+            ImageDataset(image_paths, self._transform, self.draft_size),
+            batch_size=batch_size,
+            shuffle=False,
+            num_workers=num_workers,
+            pin_memory=self.model.device.type == "cuda",
+            collate_fn=collate_images,
+            **loader_kwargs
+        )
+
+    def set_onnx_session(self, session) -> None:
+        """
+        Route batched image encoding through an ONNX Runtime session instead of torch.
+        
+        Args:
+            session (onnxruntime.InferenceSession): Session for the exported vision encoder
+        """
+        self._onnx_session = session
+
+    def encode_pixel_values(self, pixel_values: torch.Tensor) -> np.ndarray:
+        """
+        Run the CLIP vision tower on a batch of preprocessed images.
+        
+        Args:
+            pixel_values (torch.Tensor): Batch of images shaped (N, 3, H, W)
+            
+        Returns:
+            np.ndarray: L2-normalized float32 image embeddings
+        """
+        if self._onnx_session is not None:
+            features = self._onnx_session.run(None, {"pixel_values": pixel_values.numpy()})[0]
+            features = features.astype(np.float32)
+            return features / np.linalg.norm(features, axis=1, keepdims=True)
+
+        device = self.model.device
+        dtype = self._clip.dtype
+        if device.type == "cuda":
+            if not pixel_values.is_pinned():
+                pixel_values = pixel_values.pin_memory()
+            pixel_values = pixel_values.to(device, dtype=dtype, non_blocking=True)
+        else:
+            pixel_values = pixel_values.to(device, dtype=dtype)
+
+        with torch.inference_mode():
+            features = self._clip.get_image_features(pixel_values=pixel_values)
+            features = F.normalize(features.float(), dim=-1)
+        return features.cpu().numpy()
+
+    def resolve_path(self, image_path: Path) -> str:
+        """
+        Get the absolute path of a gallery image without a realpath syscall per image.
+        Paths under the gallery directory are joined onto its root, which is resolved once.
+        
+        Args:
+            image_path (Path): Path of an image, usually relative to the gallery directory
+            
+        Returns:
+            str: Absolute path of the image
         """
         try:
-            image = Image.open(image_path).convert("RGB")
-            return self.model.encode(image)
-        except Exception as e:
-            print(f"Error processing {image_path}: {e}")
-            raise
+            return str(self._base_resolved / Path(image_path).relative_to(self.base_path))
+        except ValueError:
+            return str(Path(image_path).resolve())
 
     def get_relative_path(self, absolute_path: Path) -> Path:
         """
         Convert absolute path to path relative to gallery base directory.
+        Results are memoized, so repeated search hits cost no filesystem calls.
         
         Args:
             absolute_path (Path): Absolute path to convert
             
+        Returns:
+            Path: Relative path from gallery base
+        """
+        return self._relative_path_cache(str(absolute_path))
+
+    def _compute_relative_path(self, absolute_path: str) -> Path:
+        """
+        Uncached implementation of get_relative_path, keyed by the path string.
+        Images outside the gallery are copied into it; the /images mount does not follow symlinks.
+        
+        Args:
+            absolute_path (str): Absolute path to convert
+            
         Returns:
             Path: Relative path from gallery base
         """
         try:
             abs_path = Path(absolute_path).resolve()
-            base = self.base_path.resolve()
             
             try:
-                return abs_path.relative_to(base)
+                return abs_path.relative_to(self._base_resolved)
             except ValueError:
                 new_path = self.base_path / abs_path.name
                 if not new_path.exists():
                     shutil.copy2(abs_path, new_path)
                 return new_path.relative_to(self.base_path)
         except Exception as e:
-            print(f"Error converting path {absolute_path}: {e}")
+            logger.debug("Error converting path %s: %s", absolute_path, e)
             raise
 
     def is_valid_image(self, path: Path) -> bool:
@@ -224,21 +621,51 @@ class ImageProcessor:
         all_images = self.get_all_images()
         unprocessed = []
         
-        print(f"\nChecking for unprocessed images:")
+        print("\nChecking for unprocessed images:")
         print(f"Total images found: {len(all_images)}")
-        print(f"Already processed paths: {len(self._processed_paths)}")
+        print(f"Already processed paths: {len(self._processed_files)}")
         
         for img in all_images:
-            resolved_path = str(img.resolve())
-            if resolved_path not in self._processed_paths:
+            if self._file_key(img) not in self._processed_files:
                 if self.is_valid_image(img):
                     unprocessed.append(img)
                 else:
-                    print(f"Skipping invalid image: {img}")
+                    logger.debug("Skipping invalid image: %s", img)
         
         print(f"Found {len(unprocessed)} unprocessed valid images\n")
         return unprocessed
 
+    @staticmethod
+    def _stat_key(stat: os.stat_result) -> Tuple[int, int, int, int]:
+        """
+        Identify a file version by its device and inode numbers, size and modification time.
+        Size and mtime keep a new file that reuses the inode of a deleted one from matching its key.
+        
+        Args:
+            stat (os.stat_result): Result of stat on the file
+            
+        Returns:
+            Tuple[int, int, int, int]: (st_dev, st_ino, st_size, st_mtime_ns)
+        """
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @classmethod
+    def _file_key(cls, path: Union[str, Path]) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Identify a file with a single stat call, unaffected by how the path is spelled or which symlinks lead to it.
+        
+        Args:
+            path (Union[str, Path]): Path of the file
+            
+        Returns:
+            Optional[Tuple[int, int, int, int]]: Key from _stat_key, or None if the file does not exist
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return cls._stat_key(stat)
+
     def mark_as_processed(self, image_path: Path) -> None:
         """
         Mark an image as processed.
@@ -246,4 +673,17 @@ class ImageProcessor:
         Args:
             image_path (Path): Path to the processed image
         """
-        self._processed_paths.add(str(image_path.resolve()))
+        file_key = self._file_key(image_path)
+        if file_key is not None:
+            self._processed_files.add(file_key)
+
+    def mark_many_as_processed(self, resolved_paths: List[str]) -> None:
+        """
+        Mark a batch of images as processed in a single update.
+        
+        Args:
+            resolved_paths (List[str]): Absolute, already resolved paths to the processed images
+        """
+        self._processed_files.update(
+            file_key for file_key in map(self._file_key, resolved_paths) if file_key is not None
+        )
@@ -0,0 +1,85 @@
+"""
+Utility functions for serving CLIP image embeddings through ONNX Runtime.
+Exports the vision tower of the SentenceTransformer model once and loads it with the fastest available provider.
+"""
+from pathlib import Path
+from typing import Union
+import torch
+from sentence_transformers import SentenceTransformer
+
+class _VisionTower(torch.nn.Module):
+    """Wraps the CLIP vision model and projection so it can be traced as a single graph."""
+
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.clip_model.get_image_features(pixel_values=pixel_values)
+
+def export_vision_encoder(model: SentenceTransformer, onnx_path: Union[str, Path]) -> None:
+    """
+    Export the CLIP vision tower of a SentenceTransformer model to ONNX.
+    The batch dimension is dynamic so the exported graph serves any batch size.
+
+    Args:
+        model (SentenceTransformer): CLIP SentenceTransformer whose vision tower is exported
+        onnx_path (Union[str, Path]): Destination of the ONNX file
+    """
+    onnx_path = Path(onnx_path)
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+
+    clip_model = model[0].model
+    crop_size = model[0].processor.image_processor.crop_size
+    if isinstance(crop_size, dict):
+        crop_size = crop_size["height"]
+
+    parameter = next(clip_model.parameters())
+    dummy_input = torch.zeros(1, 3, crop_size, crop_size, device=parameter.device, dtype=parameter.dtype)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _VisionTower(clip_model).eval(),
+            (dummy_input,),
+            str(onnx_path),
+            input_names=["pixel_values"],
+            output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=17
+        )
+
+def create_inference_session(onnx_path: Union[str, Path], device: str):
+    """
+    Load an exported vision encoder into an ONNX Runtime session.
+    On CUDA, TensorRT is preferred with FP16 and an on-disk engine cache so the engine is only built once.
+
+    Args:
+        onnx_path (Union[str, Path]): Path to the exported ONNX file
+        device (str): Device the application runs on ("cuda" or "cpu")
+
+    Returns:
+        onnxruntime.InferenceSession: Session ready to encode pixel value batches
+    """
+    import onnxruntime as ort
+
+    onnx_path = Path(onnx_path)
+    if device == "cuda":
+        providers = [
+            ("TensorrtExecutionProvider", {
+                "trt_fp16_enable": True,
+                "trt_max_workspace_size": 4096 * 1024 * 1024,
+                "trt_engine_cache_enable": True,
+                "trt_engine_cache_path": str(onnx_path.parent),
+            }),
+            "CUDAExecutionProvider",
+            "CPUExecutionProvider",
+        ]
+    else:
+        providers = ["CPUExecutionProvider"]
+
+    available = set(ort.get_available_providers())
+    providers = [
+        provider for provider in providers
+        if (provider[0] if isinstance(provider, tuple) else provider) in available
+    ]
+    return ort.InferenceSession(str(onnx_path), providers=providers)
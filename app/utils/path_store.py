@@ -0,0 +1,177 @@
+"""
+SQLite-backed mapping between FAISS vector IDs and image paths.
+Lets the index look up only the paths it returns and check membership without loading the full path list.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# SQLite's default limit on bound parameters per statement is 999.
+_MAX_QUERY_PARAMS = 900
+
+class PathStore:
+    """
+    Persists which image path each FAISS vector ID belongs to.
+    Writes open their own connection and per-query reads reuse a connection owned by the calling thread,
+    so a store can be shared between the indexing thread and request handlers.
+    """
+
+    def __init__(self, db_path: Union[str, Path], legacy_paths_file: Optional[Union[str, Path]] = None):
+        """
+        Open the store, creating the database on first use.
+
+        Args:
+            db_path (Union[str, Path]): Path to the SQLite database file
+            legacy_paths_file (Optional[Union[str, Path]]): Newline-delimited paths file to import
+                when the database does not exist yet. Line numbers are used as vector IDs.
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        is_new = not self.db_path.exists()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (path TEXT PRIMARY KEY, row_id INTEGER NOT NULL)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS embeddings_row_id ON embeddings (row_id)")
+
+        if is_new and legacy_paths_file is not None and Path(legacy_paths_file).exists():
+            print(f"Importing paths from {legacy_paths_file}...")
+            with open(legacy_paths_file, 'r') as f:
+                rows = ((Path(line.strip()).resolve().as_posix(), row_id) for row_id, line in enumerate(f))
+                with self._connect() as conn:
+                    conn.executemany("INSERT OR IGNORE INTO embeddings (path, row_id) VALUES (?, ?)", rows)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection that commits on success and is always closed."""
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        # WAL stays consistent without syncing every commit; only checkpoints hit the disk synchronously.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        """Get this thread's read connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def __bool__(self) -> bool:
+        return self._reader().execute("SELECT 1 FROM embeddings LIMIT 1").fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def next_row_id(self) -> int:
+        """
+        Get the smallest vector ID greater than every stored ID.
+
+        Returns:
+            int: Next free vector ID
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(row_id) + 1, 0) FROM embeddings").fetchone()[0]
+
+    def replace_all(self, paths: Sequence[str]) -> None:
+        """
+        Replace the stored mapping with the given paths, numbered from zero.
+
+        Args:
+            paths (Sequence[str]): Resolved image paths in vector ID order
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM embeddings")
+            conn.executemany(
+                "INSERT INTO embeddings (path, row_id) VALUES (?, ?)",
+                ((path, row_id) for row_id, path in enumerate(paths))
+            )
+
+    def add(self, rows: Iterable[Tuple[str, int]]) -> None:
+        """
+        Add (path, vector ID) pairs to the store.
+
+        Args:
+            rows (Iterable[Tuple[str, int]]): Resolved image paths and their vector IDs
+        """
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO embeddings (path, row_id) VALUES (?, ?)", rows)
+
+    def filter_new(self, paths: Sequence[str]) -> List[str]:
+        """
+        Get the paths that are not in the store yet, preserving order.
+
+        Args:
+            paths (Sequence[str]): Resolved image paths to check
+
+        Returns:
+            List[str]: Paths without a stored vector ID
+        """
+        existing = set()
+        with self._connect() as conn:
+            for start in range(0, len(paths), _MAX_QUERY_PARAMS):
+                chunk = paths[start:start + _MAX_QUERY_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(
+                    row[0] for row in conn.execute(f"SELECT path FROM embeddings WHERE path IN ({placeholders})", chunk)
+                )
+        return [path for path in paths if path not in existing]
+
+    def lookup(self, row_ids: Sequence[int]) -> List[str]:
+        """
+        Get the paths for the given vector IDs, preserving order and skipping unknown IDs.
+
+        Args:
+            row_ids (Sequence[int]): Vector IDs returned by a FAISS search
+
+        Returns:
+            List[str]: Image paths in the order of row_ids
+        """
+        found = self.paths_by_id(row_ids)
+        return [found[row_id] for row_id in map(int, row_ids) if row_id in found]
+
+    def paths_by_id(self, row_ids: Sequence[int]) -> Dict[int, str]:
+        """
+        Get the stored paths for the given vector IDs.
+
+        Args:
+            row_ids (Sequence[int]): Vector IDs to look up
+
+        Returns:
+            Dict[int, str]: Mapping of each known vector ID to its image path
+        """
+        found = {}
+        conn = self._reader()
+        for start in range(0, len(row_ids), _MAX_QUERY_PARAMS):
+            chunk = [int(row_id) for row_id in row_ids[start:start + _MAX_QUERY_PARAMS]]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(conn.execute(f"SELECT row_id, path FROM embeddings WHERE row_id IN ({placeholders})", chunk))
+        return found
+
+    def row_ids(self) -> List[int]:
+        """
+        Get every stored vector ID.
+
+        Returns:
+            List[int]: Stored vector IDs
+        """
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT row_id FROM embeddings")]
+
+    def all_paths(self) -> List[str]:
+        """
+        Get every stored image path.
+
+        Returns:
+            List[str]: Stored image paths
+        """
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT path FROM embeddings")]
@@ -0,0 +1,73 @@
+"""
+Coalesces concurrent search queries into batched calls.
+Lets queries that arrive together share one model.encode and one FAISS search.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+class QueryBatcher:
+    """
+    Collects queries submitted from any thread and answers them in batches on a single worker thread.
+    A batch is dispatched once the first query has waited the batching window or the batch is full.
+    """
+
+    def __init__(self, search_batch: Callable[[List[str]], List[List[str]]], window: float, max_batch_size: int):
+        """
+        Start the worker thread.
+
+        Args:
+            search_batch (Callable[[List[str]], List[List[str]]]): Function returning the results of each query in a list
+            window (float): Seconds the first query of a batch waits for others to join it
+            max_batch_size (int): Largest number of queries searched in one call
+        """
+        self._search_batch = search_batch
+        self._window = window
+        self._max_batch_size = max_batch_size
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._worker.start()
+
+    def search(self, query: str) -> List[str]:
+        """
+        Search for a query together with any others submitted at about the same time.
+
+        Args:
+            query (str): Query to search for
+
+        Returns:
+            List[str]: Similar image paths for the query
+        """
+        future: Future = Future()
+        self._queue.put((query, future))
+        return future.result()
+
+    def _run(self) -> None:
+        """Dispatch batches of queued queries until the process exits."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            queries = [query for query, _ in batch]
+            try:
+                results = self._search_batch(queries)
+            except Exception as e:
+                logger.exception("Batched search failed")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -2,70 +2,431 @@
 Utility functions for managing FAISS-based similarity search index.
 Provides functionality for creating, loading, and searching image embeddings.
 """
-import os
+import functools
+import logging
+import math
+import threading
 import numpy as np
 import faiss
 from PIL import Image
-from typing import Tuple, List, Union
+from typing import Callable, Dict, Optional, Tuple, List, Union
 from pathlib import Path
+from app.utils.path_store import PathStore
 
-def create_faiss_index(embeddings: List[np.ndarray], image_paths: List[str], index_path: Union[str, Path]) -> None:
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+# Galleries smaller than this use an exhaustive index storing FP16 vectors; larger ones switch to 8-bit scalar quantization.
+SQ8_INDEX_THRESHOLD = 1_000
+# Galleries smaller than this use an exhaustive scalar-quantized index; larger ones switch to an HNSW graph over 8-bit codes.
+FLAT_INDEX_THRESHOLD = 10_000
+# Galleries at least this large switch from HNSW to IVF-PQ with one byte per 8 dimensions, bounding memory per image.
+IVF_INDEX_THRESHOLD = 1_000_000
+# Neighbours per HNSW graph node, and candidate list sizes used while inserting and while searching.
+HNSW_NEIGHBORS = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# Fraction by which the trained per-dimension 8-bit ranges are widened, so vectors added later are rarely clipped.
+SQ8_RANGE_MARGIN = 0.05
+# Dimensions per product-quantizer sub-vector; each sub-vector is encoded in one byte.
+PQ_SUBVECTOR_DIMS = 8
+# Number of IVF cells probed per query.
+DEFAULT_NPROBE = 16
+# With USE_GPU, indexes holding fewer vectors than this stay on the CPU, where they already search in milliseconds.
+GPU_INDEX_THRESHOLD = 50_000
+# String queries with one of these suffixes are treated as image paths rather than text.
+_IMG_EXT = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
+
+# Path stores opened so far, keyed by the resolved path of their index file.
+_path_stores: Dict[str, PathStore] = {}
+_path_stores_lock = threading.Lock()
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _normalize_rows_jit(vectors):
+        for i in prange(vectors.shape[0]):
+            norm_sq = np.float32(0.0)
+            for j in range(vectors.shape[1]):
+                norm_sq += vectors[i, j] * vectors[i, j]
+            if norm_sq > 0:
+                inv_norm = np.float32(1.0) / np.sqrt(norm_sq)
+                for j in range(vectors.shape[1]):
+                    vectors[i, j] *= inv_norm
+
+def normalize_rows(vectors: np.ndarray) -> None:
+    """
+    L2-normalize a float32 matrix in place.
+    Uses a parallel numba kernel when numba is installed, otherwise faiss.normalize_L2.
+    
+    Args:
+        vectors (np.ndarray): C-contiguous (N, d) float32 matrix
+    """
+    if njit is not None and len(vectors):
+        _normalize_rows_jit(vectors)
+    else:
+        faiss.normalize_L2(vectors)
+
+@functools.lru_cache(maxsize=1 << 16)
+def _canonical_path(path: str) -> str:
+    """
+    Get the resolved POSIX form of an image path as stored in the path store.
+    Memoized, so paths seen again across index updates are only resolved once.
+    
+    Args:
+        path (str): Image path in any form
+        
+    Returns:
+        str: Resolved path with forward slashes
+    """
+    return Path(path).resolve().as_posix()
+
+def _index_factory_string(num_vectors: int, dimension: int) -> str:
+    """
+    Choose the FAISS index layout for a gallery of the given size.
+    
+    Args:
+        num_vectors (int): Number of vectors the index is built from
+        dimension (int): Dimension of the vectors
+        
+    Returns:
+        str: FAISS index factory string
+    """
+    if num_vectors < SQ8_INDEX_THRESHOLD:
+        return "SQfp16"
+    if num_vectors < FLAT_INDEX_THRESHOLD:
+        return "SQ8"
+    if num_vectors < IVF_INDEX_THRESHOLD:
+        return f"HNSW{HNSW_NEIGHBORS}_SQ8"
+    nlist = int(4 * math.sqrt(num_vectors))
+    pq_subvectors = dimension // PQ_SUBVECTOR_DIMS if dimension % PQ_SUBVECTOR_DIMS == 0 else dimension
+    return f"IVF{nlist},PQ{pq_subvectors}x8"
+
+def _build_index(vectors: np.ndarray) -> faiss.Index:
+    """
+    Create an empty, trained index suited to the given normalized vectors.
+    IVF variants are trained on a random sample and keep a direct map so vectors can be reconstructed.
+    8-bit scalar quantizers, including the storage of HNSW graphs, learn per-dimension ranges from all vectors.
+    
+    Args:
+        vectors (np.ndarray): L2-normalized float32 vectors the index will hold
+        
+    Returns:
+        faiss.Index: Empty ID-mapped index ready for add_with_ids
+    """
+    num_vectors, dimension = vectors.shape
+    base_index = faiss.index_factory(dimension, _index_factory_string(num_vectors, dimension), faiss.METRIC_INNER_PRODUCT)
+    
+    if isinstance(base_index, faiss.IndexHNSW):
+        base_index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        faiss.downcast_index(base_index.storage).sq.rangestat_arg = SQ8_RANGE_MARGIN
+        base_index.train(vectors)
+    elif isinstance(base_index, faiss.IndexScalarQuantizer) and not base_index.is_trained:
+        base_index.sq.rangestat_arg = SQ8_RANGE_MARGIN
+        base_index.train(vectors)
+    elif not base_index.is_trained:
+        ivf = faiss.extract_index_ivf(base_index)
+        sample_size = min(num_vectors, max(num_vectors // 10, 39 * max(ivf.nlist, 256)))
+        sample = np.random.default_rng().choice(num_vectors, size=sample_size, replace=False)
+        base_index.train(vectors[sample])
+        ivf.make_direct_map()
+    
+    return faiss.IndexIDMap2(base_index)
+
+def _reconstruct_all(index: faiss.Index, spare_rows: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get every vector stored in an ID-mapped index together with its ID.
+    Vectors are decoded straight into a preallocated buffer.
+    
+    Args:
+        index (faiss.Index): ID-mapped index to read
+        spare_rows (int): Extra uninitialized rows to allocate after the stored vectors,
+            so callers can append vectors without another copy
+        
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (N + spare_rows, d) float32 vectors and the int64 IDs of
+            the first N, in storage order
+    """
+    base_index = faiss.downcast_index(index.index)
+    vectors = np.empty((base_index.ntotal + spare_rows, base_index.d), dtype=np.float32)
+    base_index.reconstruct_n(0, base_index.ntotal, vectors[:base_index.ntotal])
+    return vectors, faiss.vector_to_array(index.id_map)
+
+def _configure_search(index: faiss.Index) -> None:
+    """
+    Apply query-time parameters to a loaded index.
+    
+    Args:
+        index (faiss.Index): Index about to be searched
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = DEFAULT_NPROBE
+    elif isinstance(index, faiss.IndexIDMap):
+        base_index = faiss.downcast_index(index.index)
+        if isinstance(base_index, faiss.IndexHNSW):
+            base_index.hnsw.efSearch = HNSW_EF_SEARCH
+
+def _is_exhaustive(index: faiss.Index) -> bool:
+    """
+    Check whether an ID-mapped index scans every stored vector per query.
+    
+    Args:
+        index (faiss.Index): ID-mapped index to inspect
+        
+    Returns:
+        bool: False for IVF and HNSW indexes, True for flat and scalar-quantized ones
+    """
+    return faiss.try_extract_index_ivf(index) is None and not isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW)
+
+def get_path_store(index_path: Union[str, Path]) -> PathStore:
+    """
+    Get the store mapping vector IDs of an index to image paths.
+    Each store is opened once per process and shared by later adds and searches, along with its read connections.
+    A legacy newline-delimited .paths file next to the index is imported on first use.
+    
+    Args:
+        index_path (Union[str, Path]): Path to the FAISS index file
+        
+    Returns:
+        PathStore: Path store kept next to the index
+    """
+    index_path = Path(index_path)
+    key = _canonical_path(str(index_path))
+    with _path_stores_lock:
+        path_store = _path_stores.get(key)
+        if path_store is None:
+            path_store = PathStore(index_path.with_name("paths.sqlite"), legacy_paths_file=Path(str(index_path) + '.paths'))
+            _path_stores[key] = path_store
+        return path_store
+
+def create_faiss_index(embeddings: Union[np.ndarray, List[np.ndarray]], image_paths: List[str], index_path: Union[str, Path]) -> None:
     """
     Create a new FAISS index from image embeddings.
     
     Args:
-        embeddings (List[np.ndarray]): List of image embeddings
+        embeddings (Union[np.ndarray, List[np.ndarray]]): Embedding matrix or list of image embeddings
         image_paths (List[str]): List of corresponding image paths
         index_path (Union[str, Path]): Path to save the FAISS index
     """
     index_path = Path(index_path)
-    dimension = len(embeddings[0])
-    
-    base_index = faiss.IndexFlatIP(dimension)
-    index = faiss.IndexIDMap(base_index)
     
-    vectors = np.array(embeddings).astype(np.float32)
-    faiss.normalize_L2(vectors)
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    normalize_rows(vectors)
     
+    index = _build_index(vectors)
     ids = np.arange(len(embeddings))
     index.add_with_ids(vectors, ids)
     
     faiss.write_index(index, str(index_path))
     
-    paths_file = Path(str(index_path) + '.paths')
-    with paths_file.open('w') as f:
-        for img_path in image_paths:
-            f.write(f"{Path(img_path).resolve().as_posix()}\n")
+    get_path_store(index_path).replace_all([_canonical_path(str(img_path)) for img_path in image_paths])
 
-def load_faiss_index(index_path: Union[str, Path]) -> Tuple[faiss.Index, List[str]]:
+def load_faiss_index(index_path: Union[str, Path]) -> Tuple[faiss.Index, PathStore]:
     """
-    Load a FAISS index and its associated image paths from disk.
+    Load a FAISS index from disk together with the store of its image paths.
     
     Args:
         index_path (Union[str, Path]): Path to the FAISS index file
         
     Returns:
-        Tuple[faiss.Index, List[str]]: Loaded index and list of image paths
+        Tuple[faiss.Index, PathStore]: Loaded index and its path store, or (None, None) on failure
     """
     index_path = Path(index_path)
     
     try:
         index = faiss.read_index(str(index_path))
+        _configure_search(index)
     except Exception as e:
         print(f"Error reading index file: {e}")
-        return None, []
+        return None, None
     
     try:
-        paths_file = Path(str(index_path) + '.paths')
-        with paths_file.open('r') as f:
-            image_paths = [line.strip() for line in f]
-        return index, image_paths
+        return index, get_path_store(index_path)
     except Exception as e:
-        print(f"Error reading paths file: {e}")
-        return index, []
+        print(f"Error opening path store: {e}")
+        return index, None
+
+def gpu_available() -> bool:
+    """
+    Check whether this FAISS build can place indexes on a GPU.
+    
+    Returns:
+        bool: True if FAISS has GPU support and at least one GPU is visible
+    """
+    return hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0
+
+def index_to_gpu(index: faiss.Index, resources: "faiss.StandardGpuResources", device: int = 0) -> faiss.Index:
+    """
+    Copy an index to GPU memory for searching.
+    Vectors and IVFPQ lookup tables are kept in float16, halving the memory read per query.
+    
+    Args:
+        index (faiss.Index): CPU index to copy
+        resources (faiss.StandardGpuResources): GPU resources shared across copies
+        device (int): GPU device number
+        
+    Returns:
+        faiss.Index: GPU copy of the index, or the original index if it cannot be moved
+    """
+    if isinstance(index, faiss.IndexIDMap) and isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+        # FAISS has no GPU implementation of HNSW graphs
+        return index
+    try:
+        options = faiss.GpuClonerOptions()
+        options.useFloat16 = True
+        return faiss.index_cpu_to_gpu(resources, device, index, options)
+    except Exception as e:
+        print(f"Could not move index to GPU, searching on CPU: {e}")
+        return index
+
+class DeltaIndex:
+    """
+    In-memory exhaustive index of recently embedded images that are not merged into the on-disk index yet.
+    Lets new images become searchable without rewriting the index file on every indexing run.
+    """
+
+    def __init__(self):
+        """Create an empty delta index; its dimension is taken from the first embeddings added."""
+        self._index: Optional[faiss.IndexFlatIP] = None
+        self._paths: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def add(self, embeddings: np.ndarray, image_paths: List[str]) -> None:
+        """
+        Add embeddings of images that are not in the on-disk index.
+        
+        Args:
+            embeddings (np.ndarray): (N, d) image embeddings
+            image_paths (List[str]): Paths of the embedded images
+        """
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        normalize_rows(vectors)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(vectors.shape[1])
+            self._index.add(vectors)
+            self._paths.extend(_canonical_path(str(path)) for path in image_paths)
+
+    def snapshot(self) -> Tuple[np.ndarray, List[str]]:
+        """
+        Get the buffered vectors and paths for merging into the on-disk index.
+        
+        Returns:
+            Tuple[np.ndarray, List[str]]: (N, d) normalized vectors and their image paths
+        """
+        with self._lock:
+            if self._index is None:
+                return np.empty((0, 0), dtype=np.float32), []
+            vectors = faiss.rev_swig_ptr(self._index.get_xb(), self._index.ntotal * self._index.d)
+            return vectors.reshape(self._index.ntotal, self._index.d).copy(), list(self._paths)
+
+    def discard(self, count: int) -> None:
+        """
+        Drop the oldest buffered entries once they have been merged.
+        
+        Args:
+            count (int): Number of entries, as returned by snapshot, that were merged
+        """
+        with self._lock:
+            if self._index is None or count <= 0:
+                return
+            remaining = self._index.ntotal - count
+            if remaining > 0:
+                vectors = faiss.rev_swig_ptr(self._index.get_xb(), self._index.ntotal * self._index.d)
+                kept = vectors.reshape(self._index.ntotal, self._index.d)[count:].copy()
+            self._index.reset()
+            if remaining > 0:
+                self._index.add(kept)
+            del self._paths[:count]
+
+    def search(self, query_features: np.ndarray, top_k: int) -> Tuple[np.ndarray, List[List[str]]]:
+        """
+        Search the buffered vectors with normalized query embeddings.
+        
+        Args:
+            query_features (np.ndarray): (Q, d) L2-normalized query embeddings
+            top_k (int): Number of matches to return per query
+            
+        Returns:
+            Tuple[np.ndarray, List[List[str]]]: (Q, k) similarities and the matching paths per query
+        """
+        with self._lock:
+            if not self._paths:
+                return np.empty((len(query_features), 0), dtype=np.float32), [[] for _ in query_features]
+            distances, rows = self._index.search(query_features, min(top_k, len(self._paths)))
+            return distances, [[self._paths[row] for row in query_rows] for query_rows in rows]
+
+def _search_features(query_features: np.ndarray, index: faiss.Index, path_store: PathStore,
+                     top_k: int, delta: Optional[DeltaIndex] = None) -> List[List[str]]:
+    """
+    Search the index with a matrix of query embeddings in a single FAISS call.
+    
+    Args:
+        query_features (np.ndarray): (Q, d) query embeddings
+        index (faiss.Index): FAISS index for similarity search
+        path_store (PathStore): Store mapping vector IDs to image paths
+        top_k (int): Number of similar images to retrieve per query
+        delta (Optional[DeltaIndex]): Recently added images to search alongside the index
+        
+    Returns:
+        List[List[str]]: Similar image paths for each query, best match first
+    """
+    query_features = np.ascontiguousarray(query_features, dtype=np.float32)
+    normalize_rows(query_features)
+    distances, indices = index.search(query_features, top_k)
+    # FAISS pads rows with -1 when fewer than top_k vectors match
+    if delta is None or not len(delta):
+        return [path_store.lookup(row[row >= 0].tolist()) for row in indices]
+    
+    # Both indexes score by inner product, so their candidates are merged by similarity
+    found = path_store.paths_by_id(indices[indices >= 0].tolist())
+    delta_distances, delta_paths = delta.search(query_features, top_k)
+    results = []
+    for row in range(len(query_features)):
+        scored = [(score, found[idx]) for score, idx in zip(distances[row].tolist(), indices[row].tolist()) if idx in found]
+        scored.extend(zip(delta_distances[row], delta_paths[row]))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        results.append([path for _, path in scored[:top_k]])
+    return results
+
+def _encode_queries(queries: List[Union[str, Image.Image]], model,
+                    image_encoder: Optional[Callable[[List[Image.Image]], np.ndarray]] = None) -> np.ndarray:
+    """
+    Embed loaded text and image queries into one matrix, keeping query order.
+    
+    Args:
+        queries (List[Union[str, Image.Image]]): Query texts and opened images
+        model: Model for generating embeddings
+        image_encoder (Optional[Callable[[List[Image.Image]], np.ndarray]]): Function embedding images;
+            model.encode is used for them when None
+        
+    Returns:
+        np.ndarray: (Q, d) float32 query embeddings
+    """
+    image_rows = [row for row, query in enumerate(queries) if isinstance(query, Image.Image)]
+    if image_encoder is None or not image_rows:
+        return np.asarray(model.encode(queries), dtype=np.float32).reshape(len(queries), -1)
+    
+    image_features = np.asarray(image_encoder([queries[row] for row in image_rows]), dtype=np.float32)
+    features = np.empty((len(queries), image_features.shape[1]), dtype=np.float32)
+    features[image_rows] = image_features
+    text_rows = [row for row, query in enumerate(queries) if not isinstance(query, Image.Image)]
+    if text_rows:
+        features[text_rows] = np.asarray(model.encode([queries[row] for row in text_rows]), dtype=np.float32)
+    return features
 
 def retrieve_similar_images(query: Union[str, Image.Image], model, index: faiss.Index, 
-                          image_paths: List[str], top_k: int = 3) -> Tuple[Union[str, Image.Image], List[str]]:
+                          path_store: PathStore, top_k: int = 3,
+                          delta: Optional[DeltaIndex] = None,
+                          image_encoder: Optional[Callable[[List[Image.Image]], np.ndarray]] = None
+                          ) -> Tuple[Union[str, Image.Image], List[str]]:
     """
     Find images similar to a query using the FAISS index.
     
@@ -73,137 +434,165 @@ def retrieve_similar_images(query: Union[str, Image.Image], model, index: faiss.
         query (Union[str, Image.Image]): Query image or text
         model: Model for generating embeddings
         index (faiss.Index): FAISS index for similarity search
-        image_paths (List[str]): List of indexed image paths
+        path_store (PathStore): Store mapping vector IDs to image paths
         top_k (int): Number of similar images to retrieve
+        delta (Optional[DeltaIndex]): Recently added images to search alongside the index
+        image_encoder (Optional[Callable[[List[Image.Image]], np.ndarray]]): Function embedding image
+            queries; model.encode is used when None
         
     Returns:
         Tuple[Union[str, Image.Image], List[str]]: Query and list of similar image paths
     """
     try:
-        if isinstance(query, str):
-            if query.endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')):
-                query = Image.open(query)
-            query_features = model.encode(query)
-        else:
-            query = Image.open(query) if isinstance(query, str) else query
-            query_features = model.encode(query)
-        
-        query_features = query_features.astype(np.float32).reshape(1, -1)
-        distances, indices = index.search(query_features, top_k)
-        if len(indices) == 0 or len(indices[0]) == 0:
-            return query, []
-        retrieved_images = [image_paths[int(idx)] for idx in indices[0] if 0 <= int(idx) < len(image_paths)]
-        return query, retrieved_images
+        if isinstance(query, str) and query.lower().endswith(_IMG_EXT):
+            query = Image.open(query)
+        query_features = _encode_queries([query], model, image_encoder)
+        return query, _search_features(query_features, index, path_store, top_k, delta)[0]
     except faiss.FaissException as e:
-        print(f"FAISS error in retrieve_similar_images: {str(e)}")
+        logger.exception("FAISS error in retrieve_similar_images: %s", e)
         return None, []
     except Exception as e:
-        print(f"Error in retrieve_similar_images: {str(e)}")
+        logger.exception("Error in retrieve_similar_images: %s", e)
         return None, []
 
+def retrieve_similar_images_batch(queries: List[Union[str, Image.Image]], model, index: faiss.Index,
+                                  path_store: PathStore, top_k: int = 3,
+                                  delta: Optional[DeltaIndex] = None,
+                                  image_encoder: Optional[Callable[[List[Image.Image]], np.ndarray]] = None
+                                  ) -> List[List[str]]:
+    """
+    Find images similar to several queries with one model.encode and one FAISS search.
+    
+    Args:
+        queries (List[Union[str, Image.Image]]): Query images, image paths or texts
+        model: Model for generating embeddings
+        index (faiss.Index): FAISS index for similarity search
+        path_store (PathStore): Store mapping vector IDs to image paths
+        top_k (int): Number of similar images to retrieve per query
+        delta (Optional[DeltaIndex]): Recently added images to search alongside the index
+        image_encoder (Optional[Callable[[List[Image.Image]], np.ndarray]]): Function embedding image
+            queries; model.encode is used when None
+        
+    Returns:
+        List[List[str]]: Similar image paths for each query, in query order
+        
+    Raises:
+        Exception: Errors from loading, encoding or searching are raised rather than returned as
+            empty results, so callers caching the results never cache a failure
+    """
+    if not queries:
+        return []
+    loaded_queries = [
+        Image.open(query) if isinstance(query, str) and query.lower().endswith(_IMG_EXT) else query
+        for query in queries
+    ]
+    
+    query_features = _encode_queries(loaded_queries, model, image_encoder)
+    return _search_features(query_features, index, path_store, top_k, delta)
+
 def cleanup_faiss_index(index_path: Union[str, Path]) -> None:
     """
     Clean up duplicate entries in the FAISS index.
+    Vectors whose IDs have no path in the path store (duplicates dropped when the paths were
+    deduplicated, or writes interrupted before the store was updated) are removed.
     
     Args:
         index_path (Union[str, Path]): Path to the FAISS index file
     """
     index_path = Path(index_path)
-    paths_file = Path(str(index_path) + '.paths')
     
-    if not paths_file.exists():
+    if not index_path.exists():
         return
-        
-    # Read all paths and their corresponding indices
-    paths_with_indices = []
-    unique_paths = set()
-    duplicate_indices = set()
-    
-    with paths_file.open('r') as f:
-        for idx, line in enumerate(f):
-            resolved_path = Path(line.strip()).resolve().as_posix()
-            if resolved_path in unique_paths:
-                duplicate_indices.add(idx)
-            else:
-                unique_paths.add(resolved_path)
-                paths_with_indices.append((idx, resolved_path))
-    
-    if not duplicate_indices:
-        return
-        
+    
+    stored_ids = np.fromiter(get_path_store(index_path).row_ids(), dtype=np.int64)
     index = faiss.read_index(str(index_path))
+    index_ids = faiss.vector_to_array(index.id_map)
     
-    dimension = index.d
-    base_index = faiss.IndexFlatIP(dimension)
-    new_index = faiss.IndexIDMap(base_index)
+    keep_mask = np.isin(index_ids, stored_ids)
+    if keep_mask.all():
+        return
+    
+    duplicate_ids = np.ascontiguousarray(index_ids[~keep_mask], dtype=np.int64)
     
-    all_vectors = []
-    for i in range(index.ntotal):
-        if i not in duplicate_indices:
-            vector = index.reconstruct(i)
-            all_vectors.append(vector)
+    if _is_exhaustive(index):
+        # Flat and scalar-quantized storage renumbers rows on removal, which keeps the ID map aligned
+        index.remove_ids(faiss.IDSelectorBatch(duplicate_ids.size, faiss.swig_ptr(duplicate_ids)))
+        faiss.write_index(index, str(index_path))
+        return
     
-    vectors = np.array(all_vectors).astype(np.float32)
-    faiss.normalize_L2(vectors)
+    # IVF lists keep their internal row numbers on removal, which would misalign the ID map, and HNSW
+    # graphs cannot remove nodes at all, so the kept vectors are re-added to an emptied copy that
+    # reuses the trained quantizer.
+    # They are not renormalized: re-encoding the decoded vectors as-is reproduces their original codes.
+    all_vectors, _ = _reconstruct_all(index)
+    vectors = np.ascontiguousarray(all_vectors[keep_mask])
     
-    # Add vectors to new index
-    ids = np.arange(len(all_vectors))
+    new_index = faiss.clone_index(index)
+    new_index.reset()
+    ids = index_ids[keep_mask].astype(np.int64)
     new_index.add_with_ids(vectors, ids)
     
     faiss.write_index(new_index, str(index_path))
-    
-    with paths_file.open('w') as f:
-        for _, path in paths_with_indices:
-            if path in unique_paths:
-                f.write(f"{path}\n")
 
-def add_to_faiss_index(index_path: Union[str, Path], new_embeddings: List[np.ndarray], 
-                       new_image_paths: List[str]) -> None:
+def add_to_faiss_index(index_path: Union[str, Path], new_embeddings: Union[np.ndarray, List[np.ndarray]], 
+                       new_image_paths: List[str], force_dedupe: bool = False) -> None:
     """
     Add new embeddings to an existing FAISS index.
+    Orphaned vectors are only cleaned up first when the index and path store disagree on their size.
     
     Args:
         index_path (Union[str, Path]): Path to the FAISS index file
-        new_embeddings (List[np.ndarray]): List of new image embeddings to add
+        new_embeddings (Union[np.ndarray, List[np.ndarray]]): Embedding matrix or list of new image embeddings to add
         new_image_paths (List[str]): List of corresponding image paths
+        force_dedupe (bool): Run cleanup_faiss_index even if the sizes agree
     """
     index_path = Path(index_path)
     
-    cleanup_faiss_index(index_path)
-    
     index = faiss.read_index(str(index_path))
+    path_store = get_path_store(index_path)
+    if force_dedupe or len(path_store) != index.ntotal:
+        cleanup_faiss_index(index_path)
+        index = faiss.read_index(str(index_path))
     
-    paths_file = Path(str(index_path) + '.paths')
-    existing_paths = set()
-    if paths_file.exists():
-        with paths_file.open('r') as f:
-            for line in f:
-                existing_paths.add(Path(line.strip()).resolve().as_posix())
-    
-    filtered_embeddings = []
-    filtered_paths = []
-    for emb, path in zip(new_embeddings, new_image_paths):
-        resolved_path = Path(path).resolve().as_posix()
-        if resolved_path not in existing_paths:
-            filtered_embeddings.append(emb)
-            filtered_paths.append(resolved_path)
-            existing_paths.add(resolved_path)
-    
-    if not filtered_embeddings:
+    # Keep the first row of every path that is neither repeated earlier in the batch nor already stored
+    resolved_paths = np.array([_canonical_path(str(path)) for path in new_image_paths], dtype=str)
+    unique_paths, first_rows = np.unique(resolved_paths, return_index=True)
+    is_new = np.isin(unique_paths, path_store.filter_new(unique_paths.tolist()))
+    keep_rows = np.sort(first_rows[is_new])
+    filtered_paths = resolved_paths[keep_rows].tolist()
+    
+    if not len(keep_rows):
         print("No new unique images to add to index")
         return
     
-    vectors = np.array(filtered_embeddings).astype(np.float32)
-    faiss.normalize_L2(vectors)
+    vectors = np.asarray(new_embeddings, dtype=np.float32)
+    if len(keep_rows) < len(vectors):
+        vectors = vectors[keep_rows]
+    vectors = np.ascontiguousarray(vectors)
+    normalize_rows(vectors)
+    
+    start_id = path_store.next_row_id()
+    if index.ntotal:
+        start_id = max(start_id, int(faiss.vector_to_array(index.id_map).max()) + 1)
+    ids = np.arange(start_id, start_id + len(keep_rows))
     
-    start_id = index.ntotal
-    ids = np.arange(start_id, start_id + len(filtered_embeddings))
+    new_total = index.ntotal + len(ids)
+    outgrew_exhaustive = new_total >= FLAT_INDEX_THRESHOLD and _is_exhaustive(index)
+    outgrew_graph = new_total >= IVF_INDEX_THRESHOLD and faiss.try_extract_index_ivf(index) is None
+    full_precision = isinstance(faiss.downcast_index(index.index), faiss.IndexFlat)
+    if outgrew_exhaustive or outgrew_graph or full_precision:
+        # Rebuild with the layout for the new size: HNSW once the gallery outgrows an exhaustive scan,
+        # IVF once the graph's per-image memory grows too large, and quantized codes in place of the
+        # float32 vectors of indexes written by older versions
+        print("Rebuilding index...")
+        merged_vectors, existing_ids = _reconstruct_all(index, spare_rows=len(vectors))
+        merged_vectors[len(existing_ids):] = vectors
+        vectors = merged_vectors
+        ids = np.concatenate([existing_ids, ids])
+        index = _build_index(vectors)
     
     index.add_with_ids(vectors, ids)
     
     faiss.write_index(index, str(index_path))
     
-    mode = 'a' if paths_file.exists() else 'w'
-    with paths_file.open(mode) as f:
-        for img_path in filtered_paths:
-            f.write(f"{img_path}\n")
+    path_store.add(zip(filtered_paths, ids[-len(filtered_paths):].tolist()))
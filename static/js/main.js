@@ -2,11 +2,29 @@
  * Initializes the gallery when the DOM is fully loaded.
  * Fetches the initialization status from the server and either starts the indexing status update or loads the gallery.
  */
-document.addEventListener('DOMContentLoaded', function() {
+document.addEventListener('DOMContentLoaded', initGallery);
+
+/**
+ * Requests gallery initialization, retrying while the server is still loading the model.
+ */
+function initGallery() {
     fetch('/init', {
         method: 'POST'
-    }).then(response => response.json())
-      .then(data => {
+    }).then(response => {
+        if (response.status === 503) {
+            setTimeout(initGallery, 1000);
+            return null;
+        }
+        if (!response.ok) {
+            return response.json().then(body => {
+                throw new Error(body.detail);
+            });
+        }
+        return response.json();
+    }).then(data => {
+        if (!data) {
+            return;
+        }
         if (data.status === "initialization started") {
             updateIndexingStatus();
         } else {
@@ -14,9 +32,9 @@ document.addEventListener('DOMContentLoaded', function() {
             searchImages('');
         }
     }).catch(error => {
-        showToast('Error initializing gallery', 'error');
+        showToast('Error initializing gallery', 'error', error.message);
     });
-});
+}
 
 /**
  * Displays a toast notification message.